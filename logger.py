@@ -1,13 +1,21 @@
 """Logging configuration module."""
 
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
 import sys
 from datetime import datetime
 import os
 
+LOG_MAX_BYTES = 10_000_000  # Rotate the log file once it reaches 10 MB
+LOG_BACKUP_COUNT = 10  # Keep at most 10 rotated files per run
+
 
 def setup_logging():
     """Setup logging configuration.
+    Records are put on a queue and written by a background thread, so logging does
+    not block the download threads on file or console I/O.
 
     Returns:
         logger: Configured logger instance. Return is optional, does not need to be used.
@@ -24,8 +32,13 @@ def setup_logging():
     # Formatting
     formatter = logging.Formatter("[%(asctime)s] - %(levelname)s: %(message)s")
 
-    # File handler - only WARNING and above
-    file_handler = logging.FileHandler(log_filename, encoding="utf-8")
+    # File handler - rotated by size
+    file_handler = RotatingFileHandler(
+        log_filename,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
     file_handler.setLevel(logging.DEBUG)  # All levels
     file_handler.setFormatter(formatter)
 
@@ -34,9 +47,14 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)  # Only INFO and above
     console_handler.setFormatter(formatter)
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Logger only enqueues records, the listener thread passes them to the handlers
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)  # Flush remaining records on exit
 
     logging.debug("Logging is set up.")
 
@@ -6,7 +6,7 @@ import logging
 import sys
 
 from logger import setup_logging
-from util import download_files_within_range
+from util import MAX_CONCURRENT_DATES, download_files_within_range
 
 
 def start_download_pipeline():
@@ -38,8 +38,33 @@ def start_download_pipeline():
         help='Download historical files. Provide 1 date (single day) or 2 dates (date range)\
                         in "YYYY-MM-DD" format. Example:--historical 2025-01-09 or --historical 2025-01-09 2025-01-12',
     )
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="Check already downloaded dates against the server instead of skipping them",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip dates recorded as completed by previous runs in downloads/_state.json",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=MAX_CONCURRENT_DATES,
+        help=f"Number of dates downloaded at the same time, 1 to {MAX_CONCURRENT_DATES} (default: {MAX_CONCURRENT_DATES})",
+    )
+    parser.add_argument(
+        "--probe-index",
+        action="store_true",
+        help="Find the actual index of every date with a quick request before downloading, instead of relying on the calculation",
+    )
     args = parser.parse_args()
 
+    # Validate concurrency
+    if not 1 <= args.workers <= MAX_CONCURRENT_DATES:
+        parser.error(f"--workers must be between 1 and {MAX_CONCURRENT_DATES}.")
+
     # Request for todays file
     start_date_string = end_date_string = None
     if args.today:
@@ -57,8 +82,7 @@ def start_download_pipeline():
                 "--historical requires exactly 1 or 2 dates in YYYY-MM-DD format."
             )
     else:  # This should not happen due to mutually exclusive group
-        print("Error: Please provide either --today or --historical option.")
-        return
+        parser.error("Please provide either --today or --historical option.")
 
     # Validate date format
     try:
@@ -78,7 +102,14 @@ def start_download_pipeline():
         f"Starting download pipeline...{start_date_string} to {end_date_string}"
     )
     logging.info(f"Command executed: {" ".join(sys.argv)}")
-    download_files_within_range(start_date_string, end_date_string)
+    download_files_within_range(
+        start_date_string,
+        end_date_string,
+        revalidate=args.revalidate,
+        resume=args.resume,
+        workers=args.workers,
+        probe=args.probe_index,
+    )
 
     # Finish
     logging.info("Download pipeline completed.")
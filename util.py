@@ -9,19 +9,113 @@ Util files for various helper functions and utilities.
 6. Other failure handling
 """
 
-from time import sleep
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import random
+from threading import Lock
+from time import monotonic, sleep
+from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
+from enum import Enum
 from pathlib import Path
+import json
 import logging
+import os
+import shutil
 
 import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.util.retry import Retry
 
+logger = logging.getLogger(__name__)
 
+CIRCUIT_BREAKER_THRESHOLD = 10  # Triggered if there are 10 consecutive failures
+CIRCUIT_BREAKER_COOLDOWN = 60  # Seconds downloads are paused once triggered
+CIRCUIT_BREAKER_MAX_PROBES = 5  # Stop after 5 consecutive failed probes
+MAX_CURRENT_DATE_RETRIES = 3  # Max retries for the same date
+MAX_CONCURRENT_DATES = 8  # Max number of dates downloaded at the same time
+RETRY_BACKOFF_BASE = 2.0  # Seconds, doubled on every retry
+RETRY_BACKOFF_CAP = 60.0  # Seconds, upper bound of the wait between retries
+METADATA_FILE_NAME = ".meta.json"  # ETag / Last-Modified of the files in a date folder
+DOWNLOAD_ROOT = Path("downloads")  # Folder holding a sub folder for every date
+STATE_FILE = DOWNLOAD_ROOT / "_state.json"  # Completed / failed dates of all runs
+INDEX_CACHE_FILE = DOWNLOAD_ROOT / "_index_cache.json"  # Verified index of every date
+# (connect, read) timeouts in seconds: fail fast on an unreachable server, but allow
+# for slow transfers of large files. Read timeout applies to each read of the body.
+HTTP_TIMEOUT = (5.0, 30.0)
+CHUNK_SIZE = 64 * 1024  # Bytes, size of the chunks streamed from response to file
+REQUEST_RATE = 5  # Requests per second sent to SGX server, on average
+REQUEST_BURST = 10  # Requests that can be sent at once after being idle
+INDEX_PROBE_MARGIN = 2  # Indices probed before / after the estimate of every date
+
+BASE_URL = "https://links.sgx.com/1.0.0/derivatives-historical"
+
+# Files published by SGX for every date, downloaded as a unit
+FILES_TO_DOWNLOAD = (
+    "WEBPXTICK_DT.zip",
+    "TickData_structure.dat",
+    "TC.txt",
+    "TC_structure.dat",
+)
+DATE_PATTERN = re.compile(r"(\d{8})")  # Date in the file names, "YYYYMMDD"
+RETRY_AFTER_SECONDS_PATTERN = re.compile(r"\s*[0-9]+\s*")  # Retry-After delay-seconds
+WEEKDAY_NAMES = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+# 2025-01-06 starts on key index 5849, Monday
+BASE_DATE_ORDINAL = date(2025, 1, 6).toordinal()
+BASE_INDEX = 5849
+
+# Transient failures (connection errors, throttling, server errors) are retried per
+# request with exponential backoff, honoring the Retry-After header of the server.
+# Jitter spreads out the retries of requests that failed at the same time.
+# When retries run out, the last response is returned and fails validate_responses.
+HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    backoff_jitter=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD"]),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Shared session, keeps connections to SGX server alive across files and dates.
+# Pool is sized for all files of every concurrently downloaded date.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=len(FILES_TO_DOWNLOAD) * MAX_CONCURRENT_DATES,
+        max_retries=HTTP_RETRY,
+    ),
+)
+# Identify the scraper instead of the generic python-requests agent, and let the
+# server compress the text files, bodies are decompressed while streamed to disk
+_SESSION.headers.update(
+    {
+        "User-Agent": "Mozilla/5.0 (compatible; sgx-scrap)",
+        "Accept-Encoding": "gzip, deflate",
+    }
+)
+
+
+@lru_cache(maxsize=4096)
 def estimate_date_index(date_string):
     """Get the index of the given date.
     Used in URL generation for the requested date.
     Uses index 5849 for 2025-01-06 (Monday) as the base index.
+    Results are cached, retries of the same date do not recompute it.
 
     Args:
         date (str): The date in "YYYY-MM-DD" format.
@@ -30,16 +124,78 @@ def estimate_date_index(date_string):
         int: The index of the date.
     """
 
-    # 2025-01-06 starts on key index 5849, Monday
-    initial_date = datetime.strptime("2025-01-06", "%Y-%m-%d")
-    initial_index = 5849
+    target_date = date.fromisoformat(date_string)
+    return index_from_ordinal(target_date.toordinal())
+
+
+def index_from_ordinal(ordinal):
+    """Get the index of the date with the given proleptic Gregorian ordinal.
 
-    target_date = datetime.strptime(date_string, "%Y-%m-%d")
-    days_difference = (target_date - initial_date).days
+    Args:
+        ordinal (int): The ordinal of the date, as returned by date.toordinal().
+
+    Returns:
+        int: The index of the date.
+    """
+    days_difference = ordinal - BASE_DATE_ORDINAL
     weekends = 2 * (days_difference // 7)
-    date_index = initial_index + days_difference - weekends
+    return BASE_INDEX + days_difference - weekends
+
+
+def estimate_date_indices(date_strings, known_indices=None):
+    """Get the indices of many dates at once, so all URLs of a range can be built
+    before any download starts.
+    Indices verified by previous runs are used as they are, only the other dates are
+    estimated.
+
+    Args:
+        date_strings (list): The dates in "YYYY-MM-DD" format.
+        known_indices (dict, optional): Date string to verified index of the date,
+            as returned by load_index_cache.
 
-    return date_index
+    Returns:
+        dict: Date string to index of the date.
+    """
+    known_indices = known_indices or {}
+    return {
+        date_string: (
+            known_indices[date_string]
+            if date_string in known_indices
+            else index_from_ordinal(date.fromisoformat(date_string).toordinal())
+        )
+        for date_string in date_strings
+    }
+
+
+@lru_cache(maxsize=1)
+def _read_index_cache():
+    """Read INDEX_CACHE_FILE once, until save_index_cache replaces it.
+    The returned dict is shared and must not be modified.
+    """
+    try:
+        return json.loads(INDEX_CACHE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_index_cache():
+    """Load the indices of the dates downloaded successfully by previous runs.
+
+    Returns:
+        dict: Date string in "YYYY-MM-DD" format to verified index of the date, empty
+            if no index was recorded yet. A copy, free to be modified.
+    """
+    return dict(_read_index_cache())
+
+
+def save_index_cache(known_indices):
+    """Record the verified indices, so later runs do not have to rely on the estimate.
+
+    Args:
+        known_indices (dict): Date string in "YYYY-MM-DD" format to verified index.
+    """
+    write_json_atomically(INDEX_CACHE_FILE, known_indices)
+    _read_index_cache.cache_clear()
 
 
 def calculate_date_index_offset(date_string):
@@ -52,6 +208,7 @@ def calculate_date_index_offset(date_string):
 
     1. Estimate the date index using a simple formula.
     2. Fetch the file name from SGX server using the estimated index.
+       If a previous run verified which date is at that index, no request is needed.
     3. Extract the actual date from the file name.
     4. Calculate the offset between the estimated date and actual date.
 
@@ -64,23 +221,107 @@ def calculate_date_index_offset(date_string):
         int: The offset of the date index.
     """
 
-    date_obj = datetime.strptime(date_string, "%Y-%m-%d")
+    date_obj = date.fromisoformat(date_string)
     estimated_index = estimate_date_index(date_string)
 
-    url = f"https://links.sgx.com/1.0.0/derivatives-historical/{estimated_index}/TC.txt"
-    response = requests.get(url, timeout=10)
-    file_name_content = response.headers.get("Content-Disposition", "")
-    date_from_file_name = re.search(r"(\d{8})", file_name_content)
-    date_obj_from_file_name = datetime.strptime(date_from_file_name.group(1), "%Y%m%d")
+    # Date verified at the estimated index by a previous run, if any
+    known_dates = {index: known for known, index in _read_index_cache().items()}
+    if estimated_index in known_dates:
+        date_obj_from_file_name = date.fromisoformat(known_dates[estimated_index])
+    else:
+        url = file_url(estimated_index, "TC.txt")
+        response = fetch_headers(url)  # Only the file name is needed
+        file_name_content = response.headers.get("Content-Disposition", "")
+        file_date = DATE_PATTERN.search(file_name_content).group(1)  # "YYYYMMDD"
+        date_obj_from_file_name = date(
+            int(file_date[:4]), int(file_date[4:6]), int(file_date[6:8])
+        )
     offset = (date_obj - date_obj_from_file_name).days
 
-    logging.info(
+    logger.info(
         f"""
         Target Date: {date_obj}, Estimated Index: {estimated_index}, \n\
         Actual Date: {date_obj_from_file_name}, Actual Index: {estimated_index + offset}, \n\
         Offset: {offset}
         """
     )
+    return offset
+
+
+def probe_date_of_index(date_index):
+    """Get the date of the files published at an index, from the file name of TC.txt.
+
+    Args:
+        date_index (int): The index to probe.
+
+    Returns:
+        str: The date in "YYYY-MM-DD" format, None if there are no files at the index.
+    """
+    response = fetch_headers(file_url(date_index, "TC.txt"))  # Only the file name
+    if response.status_code != 200 or "CustomErrorPage" in response.url:
+        return None
+    file_date = DATE_PATTERN.search(response.headers.get("Content-Disposition", ""))
+    if file_date is None:
+        return None
+    file_date = file_date.group(1)  # "YYYYMMDD"
+    return f"{file_date[:4]}-{file_date[4:6]}-{file_date[6:8]}"
+
+
+def probe_indices(date_strings):
+    """Find the actual indices of many dates at once, before any download starts.
+    The indices around the estimate of every date are probed concurrently with a
+    HEAD request each, so dates shifted by an unexpected offset are found without
+    downloading the files of a wrong date first.
+
+    Args:
+        date_strings (list): The dates in "YYYY-MM-DD" format.
+
+    Returns:
+        dict: Date string of the files found to their index, for every index probed
+            successfully. May contain dates that were not requested.
+    """
+    if not date_strings:
+        return {}
+    indices = sorted(
+        {
+            date_index + shift
+            for date_index in estimate_date_indices(date_strings).values()
+            for shift in range(-INDEX_PROBE_MARGIN, INDEX_PROBE_MARGIN + 1)
+        }
+    )
+    logger.info(f"Probing {len(indices)} index(es) for {len(date_strings)} date(s)...")
+
+    probed = {}
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DATES) as executor:
+        futures = {
+            executor.submit(probe_date_of_index, date_index): date_index
+            for date_index in indices
+        }
+        for future in as_completed(futures):
+            try:
+                date_string = future.result()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Failed to probe index {futures[future]}: {e}")
+                continue
+            if date_string is not None:
+                # Keep the lowest index if a date is published more than once
+                probed[date_string] = min(
+                    futures[future], probed.get(date_string, futures[future])
+                )
+    return probed
+
+
+def file_url(date_index, file_name):
+    """Get the URL of a file published by SGX.
+
+    Args:
+        date_index (int): The index of the date.
+        file_name (str): One of FILES_TO_DOWNLOAD.
+
+    Returns:
+        str: The URL of the file.
+    """
+    return f"{BASE_URL}/{date_index}/{file_name}"
 
 
 def url_generation(date_string):
@@ -94,201 +335,853 @@ def url_generation(date_string):
     """
 
     urls = []
-    files_to_download = [
-        "WEBPXTICK_DT.zip",
-        "TickData_structure.dat",
-        "TC.txt",
-        "TC_structure.dat",
+    date_index = _read_index_cache().get(date_string)
+    if date_index is None:
+        date_index = estimate_date_index(date_string)
+    for file in FILES_TO_DOWNLOAD:
+        urls.append(file_url(date_index, file))
+
+    logger.debug(f"Using index {date_index} for date {date_string}")
+    return urls
+
+
+def plan_downloads(date_indices):
+    """Build the URLs of every file of every date before any download starts,
+    separating what to download from how it is downloaded.
+
+    Args:
+        date_indices (dict): Date string in "YYYY-MM-DD" format to index of the date.
+
+    Returns:
+        list: (date_string, file_name, url) tuples, grouped by date in order.
+    """
+    return [
+        (date_string, file_name, file_url(date_index, file_name))
+        for date_string, date_index in date_indices.items()
+        for file_name in FILES_TO_DOWNLOAD
     ]
 
-    for file in files_to_download:
-        url = f"https://links.sgx.com/1.0.0/derivatives-historical/\
-            {estimate_date_index(date_string)}/{file}"
-        urls.append(url)
 
-    logging.debug(
-        f"Using index {estimate_date_index(date_string)} for date {date_string}"
+class HostRateLimiter:
+    """Token bucket limiting the rate of requests sent to SGX server by all threads.
+
+    Tokens are refilled continuously at the given rate, up to burst tokens.
+    Every request takes one token and waits when there is none left.
+    The server can ask to slow down with the Retry-After header, which blocks all
+    requests until the time given has passed.
+
+    Args:
+        rate (float): Requests allowed per second, on average.
+        burst (int): Requests allowed at once after being idle.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = monotonic()
+        self._blocked_until = 0.0
+        self._lock = Lock()
+
+    def acquire(self):
+        """Wait until a request is allowed to be sent, then take a token."""
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            sleep(delay)
+
+    def penalize(self, seconds):
+        """Block all requests for the given number of seconds.
+
+        Args:
+            seconds (float): Time to wait, usually from the Retry-After header.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+
+
+_RATE_LIMITER = HostRateLimiter(rate=REQUEST_RATE, burst=REQUEST_BURST)
+
+
+def retry_after_seconds(response):
+    """Get the time the server asks to wait before the next request.
+
+    Args:
+        response (requests.Response): The response to read the Retry-After header from.
+
+    Returns:
+        float: Seconds to wait, None if the header is missing or invalid.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    # delay-seconds is a non-negative integer, "inf" or "1e9" are not valid
+    if RETRY_AFTER_SECONDS_PATTERN.fullmatch(retry_after):
+        return float(int(retry_after))
+    try:  # HTTP-date format
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+
+
+def send_request(method, url, **kwargs):
+    """Send a request to SGX server using the shared session.
+    Requests are rate limited across all threads, see HostRateLimiter.
+
+    Args:
+        method (str): The HTTP method, "GET" or "HEAD".
+        url (str): The URL to request.
+        **kwargs: Passed on to requests.Session.request.
+
+    Returns:
+        requests.Response: The response of the request.
+    """
+    _RATE_LIMITER.acquire()
+    response = _SESSION.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
+
+    retry_after = retry_after_seconds(response)
+    if retry_after:
+        logger.warning(f"Server asked to wait {retry_after:.0f}s before next request")
+        if retry_after > RETRY_BACKOFF_CAP:
+            # Do not let a single response block every thread for hours
+            logger.warning(f"Waiting {RETRY_BACKOFF_CAP:.0f}s at most instead")
+            retry_after = RETRY_BACKOFF_CAP
+        _RATE_LIMITER.penalize(retry_after)
+    return response
+
+
+def fetch(url, headers=None):
+    """Send a GET request to SGX server.
+    Only the headers are read, the body is streamed when it is saved.
+
+    Args:
+        url (str): The URL to request.
+        headers (dict, optional): Extra request headers.
+
+    Returns:
+        requests.Response: The response of the request, to be closed by the caller.
+    """
+    return send_request("GET", url, headers=headers, stream=True)
+
+
+def fetch_headers(url):
+    """Get the headers of a file from SGX server without transferring its body.
+    Uses a HEAD request, or a GET closed before reading the body if the server does
+    not support HEAD.
+
+    Args:
+        url (str): The URL to request.
+
+    Returns:
+        requests.Response: The closed response, only its headers can be used.
+    """
+    response = send_request("HEAD", url, allow_redirects=True)
+    if response.status_code in (405, 501):  # HEAD not allowed / not implemented
+        logger.debug(f"HEAD not supported for URL {url}, falling back to GET")
+        response = fetch(url)
+    response.close()
+    return response
+
+
+def fetch_all(urls, request_headers):
+    """Fetch the URLs concurrently, the time is spent waiting on the network.
+    If any of the requests fails, the other responses are closed.
+
+    Args:
+        urls (list): The URLs to request.
+        request_headers (list): Extra request headers for each URL.
+
+    Returns:
+        list: The responses, in the same order as the URLs.
+
+    Raises:
+        requests.exceptions.RequestException: If any of the requests fails.
+    """
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        futures = [
+            executor.submit(fetch, url, headers)
+            for url, headers in zip(urls, request_headers)
+        ]
+
+    if any(future.exception() for future in futures):
+        for future in futures:
+            if future.exception() is None:
+                future.result().close()
+    return [future.result() for future in futures]
+
+
+def partial_path(file_path):
+    """Get the hidden path a file is written to before being moved in place.
+
+    Args:
+        file_path (Path): The final path of the file.
+
+    Returns:
+        Path: The partial path, in the same folder so the move is atomic.
+    """
+    return file_path.with_name(f".{file_path.name}.part")
+
+
+def write_json_atomically(path, data):
+    """Write data as JSON to a partial path first, then move it in place, so the
+    file is never left half written if the process is killed.
+
+    Args:
+        path (Path): The path of the JSON file, its folder is created if needed.
+        data: The JSON serializable data.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path(path).write_text(
+        json.dumps(data, indent=2, sort_keys=True), encoding="utf-8"
     )
-    return urls
+    os.replace(partial_path(path), path)
 
 
-def check_existence(responses):
-    """Check if all responses are successful (status code 200), and if the files exist.
+def save_response(response, file_path):
+    """Stream the body of a response to a file, without holding it in memory.
 
     Args:
-        responses (list): List of response objects from requests.
+        response (requests.Response): A response requested with stream=True.
+        file_path (Path): The path to write to.
+    """
+    response.raw.decode_content = True  # Undo any gzip / deflate transfer encoding
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
+
+
+def save_all(responses, file_paths):
+    """Stream the bodies of the responses to their files concurrently, so that
+    disk writes of one file overlap with the transfer of the others.
+    Files are written to partial paths first and only moved in place once all of
+    them are complete, so an interrupted download never leaves truncated files.
+
+    Args:
+        responses (list): Responses requested with stream=True.
+        file_paths (list): The path to write each response to.
+
+    Raises:
+        Exception: The first error raised while saving any of the files.
+    """
+    partial_paths = [partial_path(file_path) for file_path in file_paths]
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(responses), 1)) as executor:
+            # Consume the results so any error is raised here
+            list(executor.map(save_response, responses, partial_paths))
+    except Exception:
+        for path in partial_paths:
+            path.unlink(missing_ok=True)
+        raise
+
+    for path, file_path in zip(partial_paths, file_paths):
+        os.replace(path, file_path)
+
+
+def load_metadata(folder):
+    """Load the ETag / Last-Modified headers saved from previous downloads of a date.
+
+    Args:
+        folder (Path): The download folder of the date.
 
     Returns:
-        bool: True if all responses are successful, False otherwise.
+        dict: File name to {"url": ..., "etag": ..., "last_modified": ...}, empty if
+            nothing is saved.
     """
-    for response in responses:
-        if response.status_code != 200:
-            logging.error(
-                f"Received status code {response.status_code} for URL {response.url}"
-            )
-            return False
-        if "CustomErrorPage" in response.url:
-            logging.error(f"File not found with URL {response.url}")
-            return False
-    return True
+    try:
+        return json.loads((folder / METADATA_FILE_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def conditional_headers(file_metadata, file_path, url):
+    """Build the headers for a conditional GET of a file downloaded before.
+    Server answers with a body-less 304 Not Modified if the file has not changed.
+    The validators only apply to the URL they were received from, a 304 for another
+    URL (e.g. another index of the date) would leave the date of the file unchecked.
+
+    Args:
+        file_metadata (dict): Saved {"url": ..., "etag": ..., "last_modified": ...}
+            of the file, or None.
+        file_path (Path): The local path of the file.
+        url (str): The URL the file is requested from now.
+
+    Returns:
+        dict: The conditional request headers, empty if the file is not downloaded yet
+            or was downloaded from another URL.
+    """
+    headers = {}
+    if not file_metadata or file_metadata.get("url") != url or not file_path.exists():
+        return headers
+    if file_metadata.get("etag"):
+        headers["If-None-Match"] = file_metadata["etag"]
+    if file_metadata.get("last_modified"):
+        headers["If-Modified-Since"] = file_metadata["last_modified"]
+    return headers
+
+
+class Outcome(Enum):
+    """Outcome of downloading the files of a date, tells whether a retry can help."""
+
+    OK = "ok"
+    SKIPPED = "skipped"  # Already downloaded, nothing was requested or checked
+    NOT_MODIFIED = "not_modified"  # Up to date, no dated file was sent to check
+    TRANSIENT = "transient"  # Network or server failure, may succeed when retried
+    PERMANENT_MISSING = "permanent_missing"  # Files not published, e.g. a holiday
+    DATE_MISMATCH = "date_mismatch"  # Files of another date, the index is off
 
 
-def check_date_match(date_string, responses):
-    """Check if the date in the file names from responses matches the requested date.
+def validate_responses(date_string, responses):
+    """Check in a single pass that all files exist, and that the dates in their file
+    names match the requested date.
+
+    A file exists if its response is successful (status code 200, or 304 for files
+    already downloaded and not modified) and was not redirected to the error page.
+    Files not found (404, or the error page) are missing for good, whereas other
+    unsuccessful responses are server failures that may pass when retried.
 
     Args:
         date_string (str): The requested date in "YYYY-MM-DD" format.
         responses (list): List of response objects from requests.
 
     Returns:
-        bool: True if all file dates match the requested date, False otherwise.
+        tuple: (Outcome.OK, "") if all files are valid, otherwise (outcome, reason)
+            for the first invalid file.
     """
     requested_date_formatted = date_string.replace("-", "")
     for response in responses:
-        file_name_content = response.headers.get("Content-Disposition", "")
+        if response.status_code not in (200, 304):
+            return (
+                (
+                    Outcome.PERMANENT_MISSING
+                    if response.status_code in (404, 410)
+                    else Outcome.TRANSIENT
+                ),
+                f"Received status code {response.status_code} for URL {response.url}",
+            )
+        if "CustomErrorPage" in response.url:
+            return Outcome.PERMANENT_MISSING, f"File not found with URL {response.url}"
+        if response.status_code == 304:
+            continue  # Not modified, date was checked when downloaded from this URL
 
+        file_name_content = response.headers.get("Content-Disposition", "")
         if "structure" in file_name_content:
             continue  # Skip data_structure files, they dont have date in file name
 
-        file_date = re.search(r"(\d{8})", file_name_content).group(1)
-        if file_date != requested_date_formatted:
-            logging.error(
-                f"The date in the file name {file_date} does not match the requested date {date_string}."
+        file_date = DATE_PATTERN.search(file_name_content)
+        if file_date is None:
+            return Outcome.TRANSIENT, f"No date in the file name for URL {response.url}"
+        if file_date.group(1) != requested_date_formatted:
+            return (
+                Outcome.DATE_MISMATCH,
+                f"The date in the file name {file_date.group(1)} does not match the requested date {date_string}.",
             )
-            return False
-    return True
+    return Outcome.OK, ""
+
+
+def date_file_paths(date_string):
+    """Get the local paths of FILES_TO_DOWNLOAD for a date.
+
+    Args:
+        date_string (str): The date in "YYYY-MM-DD" format.
+
+    Returns:
+        list: The paths, in the order of FILES_TO_DOWNLOAD.
+    """
+    folder = DOWNLOAD_ROOT / date_string
+    return [folder / f"{date_string}_{name}" for name in FILES_TO_DOWNLOAD]
+
+
+def is_downloaded(date_string):
+    """Check without any request if all files of a date were downloaded before.
+
+    Args:
+        date_string (str): The date in "YYYY-MM-DD" format.
 
+    Returns:
+        bool: True if all files exist and are not empty.
+    """
+    return all(
+        path.exists() and path.stat().st_size > 0
+        for path in date_file_paths(date_string)
+    )
 
-def download_files(date_string):
+
+def download_files(date_string, revalidate=False, urls=None):
     """
     Download all 4 types of files from SGX server for a specific date.
     All four files are a unit and should be downloaded or be failed together.
+    Dates already downloaded by a previous run are skipped without any request,
+    unless revalidate is set.
 
     Args:
         date_string (str): The date in "YYYY-MM-DD" format.
+        revalidate (bool): Check already downloaded files against the server.
+        urls (list, optional): The URLs of FILES_TO_DOWNLOAD for the date, generated
+            if not given.
 
     Returns:
-        int: 1 if download is successful, 0 otherwise.
+        Outcome: Outcome.OK if download is successful and the date of the files was
+            checked, Outcome.NOT_MODIFIED if the dated files were not modified,
+            Outcome.SKIPPED if the date was already downloaded, otherwise the kind of
+            failure.
     """
-    logging.info(
-        f"Downloading files for date {date_string} ({datetime.strptime(date_string, '%Y-%m-%d').strftime('%A')})..."
-    )
     # Create folder with date_string as name
-    folder = Path(f"downloads/{date_string}")
+    folder = DOWNLOAD_ROOT / date_string
     folder.mkdir(parents=True, exist_ok=True)
 
-    urls = url_generation(date_string)
+    file_names = FILES_TO_DOWNLOAD
+    file_paths = date_file_paths(date_string)
+
+    # Skip dates completely downloaded by a previous run
+    if not revalidate and is_downloaded(date_string):
+        logger.info(f"Files for date {date_string} already downloaded, skipping.")
+        return Outcome.SKIPPED
+
+    logger.info(
+        f"Downloading files for date {date_string} ({WEEKDAY_NAMES[date.fromisoformat(date_string).weekday()]})..."
+    )
+
+    if urls is None:
+        urls = url_generation(date_string)
+
+    # Only ask for files that changed since the previous download
+    metadata = load_metadata(folder)
+    request_headers = [
+        conditional_headers(metadata.get(name), path, url)
+        for name, path, url in zip(file_names, file_paths, urls)
+    ]
+    for name, headers in zip(file_names, request_headers):
+        if name.endswith(".zip"):
+            headers["Accept-Encoding"] = "identity"  # Already compressed
 
     try:
-        responses = [requests.get(url, timeout=10) for url in urls]
+        responses = fetch_all(urls, request_headers)
+    except requests.exceptions.Timeout as e:
+        logger.error(f"Timed out requesting files for date {date_string}: {e}")
+        return Outcome.TRANSIENT
     except requests.exceptions.RequestException as e:
-        logging.error(
-            f"Failed to download files for date {date_string}. Exception: {e}"
-        )
-        return 0
+        logger.error(f"Failed to download files for date {date_string}. Exception: {e}")
+        return Outcome.TRANSIENT
 
-    # Check if all responses are successful
-    if not check_existence(responses):
-        logging.error(f"One or more files do not exist for date {date_string}.")
-        return 0
+    try:
+        # Check if all files exist and their dates match the requested date
+        outcome, reason = validate_responses(date_string, responses)
+        if outcome is not Outcome.OK:
+            logger.error(f"Invalid files for date {date_string}: {reason}")
+            return outcome
 
-    # Check if the date in the file names match the requested date
-    if not check_date_match(date_string, responses):
-        logging.error(f"Date mismatch for files from date {date_string}.")
-        return 0
+        logger.debug(f"Files with correct date has been found: {date_string}")
+        # Dated files answered with 304 were not checked this time
+        date_checked = any(
+            response.status_code == 200
+            and "structure" not in response.headers.get("Content-Disposition", "")
+            for response in responses
+        )
+
+        # Files not modified since the previous download are kept as they are
+        modified = [
+            (file_name, file_path, url, response)
+            for file_name, file_path, url, response in zip(
+                file_names, file_paths, urls, responses
+            )
+            if response.status_code != 304
+        ]
+        logger.debug(
+            f"{len(file_names) - len(modified)} file(s) not modified for date {date_string}"
+        )
+        try:
+            save_all(
+                [response for _, _, _, response in modified],
+                [file_path for _, file_path, _, _ in modified],
+            )
+        except (Urllib3HTTPError, requests.exceptions.RequestException) as e:
+            # Bodies are read from the raw urllib3 stream, a read timeout or a dropped
+            # connection surfaces as a urllib3 error
+            logger.error(f"Transfer failed for files of date {date_string}: {e}")
+            return Outcome.TRANSIENT
 
-    logging.debug(f"Files with correct date has been found: {date_string}")
+        for file_name, _, url, response in modified:
+            metadata[file_name] = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            logger.debug(f"Downloaded {date_string}_{file_name}")
+    finally:
+        for response in responses:
+            response.close()
 
-    for response in responses:
-        file_name = response.url.split("/")[-1]
-        file_path = f"{folder}/{date_string}_{file_name}"
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-        logging.debug(f"Downloaded {date_string}_{file_name}")
+    write_json_atomically(folder / METADATA_FILE_NAME, metadata)
 
-    logging.info(f"All files downloaded for date {date_string}")
-    return 1
+    if not date_checked:
+        logger.info(f"Files for date {date_string} not modified")
+        return Outcome.NOT_MODIFIED
+    logger.info(f"All files downloaded for date {date_string}")
+    return Outcome.OK
 
 
-def download_files_within_range(start_date, end_date):
-    """
-    Download files from SGX server for a range of dates.
+def weekday_dates(start_date, end_date):
+    """List the weekdays within a date range, SGX does not publish data on weekends.
+    Exchange holidays are not excluded, they fail as missing files.
 
     Args:
         start_date (str): The start date in "YYYY-MM-DD" format.
         end_date (str): The end date in "YYYY-MM-DD" format.
 
     Returns:
-        None
+        list: The weekdays in "YYYY-MM-DD" format, in order, both ends inclusive.
     """
-    start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date_obj = datetime.strptime(end_date, "%Y-%m-%d")
+    start_date_obj = date.fromisoformat(start_date)
+    end_date_obj = date.fromisoformat(end_date)
 
-    # Initialization and start the download process
-    CIRCUIT_BREAKER_THRESHOLD = 10  # Triggered if there are 10 consecutive failures
-    circuit_breaker_count = 0
-    MAX_CURRENT_DATE_RETRIES = 3  # Max retries for the same date
-    current_date_fails = 0
-    dates_for_manual_retries = []
+    total_days = (end_date_obj - start_date_obj).days + 1
+    days = (start_date_obj + timedelta(days=offset) for offset in range(total_days))
+    # 5 = Saturday, 6 = Sunday
+    return [day.isoformat() for day in days if day.weekday() < 5]
 
-    current_date = start_date_obj
-    while current_date <= end_date_obj:
 
-        # Circuit breaker to avoid overwhelming the server with requests
-        if circuit_breaker_count >= CIRCUIT_BREAKER_THRESHOLD:
-            logging.error(
-                f"{circuit_breaker_count} consecutive fails detect, circuit breaker triggered. Stopping further downloads."
+class CircuitBreakerOpen(Exception):
+    """Raised when a download is not allowed because the circuit breaker is open.
+
+    Args:
+        retry_in (float): Seconds to wait before asking again, None if the breaker
+            has given up and no further downloads should be started.
+    """
+
+    def __init__(self, retry_in):
+        super().__init__(f"Circuit breaker is open, retry in {retry_in}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Circuit breaker shared by all concurrently running dates.
+
+    CLOSED: downloads run normally, consecutive failures are counted.
+    OPEN: reached after threshold consecutive failures, all downloads are blocked
+        for the cooldown period.
+    HALF_OPEN: after the cooldown, a single download is let through as a probe.
+        Only the probe decides: success closes the breaker, failure opens it for
+        another cooldown.
+    After max_probes consecutive failed probes the breaker gives up and stays open.
+
+    Args:
+        threshold (int): Number of consecutive failures before opening.
+        cooldown (float): Seconds the breaker stays open before probing.
+        max_probes (int): Number of consecutive failed probes before giving up.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, threshold, cooldown, max_probes):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_probes = max_probes
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.failed_probes = 0
+        self.opened_at = None
+        self._lock = Lock()
+
+    @property
+    def gave_up(self):
+        """bool: True if no further downloads should be started."""
+        return self.failed_probes >= self.max_probes
+
+    def before(self):
+        """Check if a download is allowed to start, call before every download.
+
+        Returns:
+            bool: True if the download is the probe, its outcome must be recorded with
+                probe=True.
+
+        Raises:
+            CircuitBreakerOpen: If the breaker is open or another download is probing.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.gave_up:
+                raise CircuitBreakerOpen(None)
+            if self.state == self.HALF_OPEN:  # Only one probe at a time
+                raise CircuitBreakerOpen(1.0)
+
+            remaining = self.cooldown - (monotonic() - self.opened_at)
+            if remaining > 0:
+                raise CircuitBreakerOpen(remaining)
+            self.state = self.HALF_OPEN
+            logger.info("Circuit breaker cooldown over, probing the server.")
+            return True
+
+    def on_success(self, probe=False):
+        """Record a successful download, closes the breaker if it was the probe.
+        Successes of downloads started before the breaker opened are ignored while it
+        is not closed, like their failures.
+
+        Args:
+            probe (bool): True if the download was the probe, as returned by before().
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and probe:
+                logger.info("Circuit breaker closed, resuming downloads.")
+                self.state = self.CLOSED
+                self.failed_probes = 0
+            if self.state == self.CLOSED:
+                self.failure_count = 0
+
+    def on_failure(self, probe=False):
+        """Record a failed download, opens the breaker on threshold or failed probe.
+        Failures of downloads started before the breaker opened are ignored while it
+        is not closed, only the probe decides whether it opens again.
+
+        Args:
+            probe (bool): True if the download was the probe, as returned by before().
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and probe:
+                self.failed_probes += 1
+                self._open()
+            elif self.state == self.CLOSED:
+                self.failure_count += 1
+                if self.failure_count >= self.threshold:
+                    logger.error(
+                        f"{self.failure_count} consecutive fails detect, circuit breaker triggered."
+                    )
+                    self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = monotonic()
+        if self.gave_up:
+            logger.error(
+                f"{self.failed_probes} consecutive probes failed. Stopping further downloads."
             )
-            failed_date_range = f"{current_date.strftime('%Y-%m-%d')} ~ {end_date}"
-            dates_for_manual_retries.append(failed_date_range)
-            break
-
-        # Skip weekends
-        if current_date.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-            logging.info(f"Skipping weekend date: {current_date.strftime('%Y-%m-%d')}")
-            current_date += timedelta(days=1)
-            continue
+        else:
+            logger.warning(f"Pausing downloads for {self.cooldown}s.")
+
 
-        # Initialize date_string and setup for failed retries
-        date_string = current_date.strftime("%Y-%m-%d")
-        success_flag = 0
+def download_date_with_retries(date_string, urls, circuit_breaker, revalidate=False):
+    """
+    Download files for a single date, retrying up to MAX_CURRENT_DATE_RETRIES times.
+    Only transient failures are retried, files missing or of another date fail
+    at once. Waits while the circuit breaker is open, time spent waiting is not an
+    attempt. Dates already downloaded are skipped without asking the breaker, they
+    send no request and tell nothing about the server.
+
+    Args:
+        date_string (str): The date in "YYYY-MM-DD" format.
+        urls (list): The URLs of FILES_TO_DOWNLOAD for the date.
+        circuit_breaker (CircuitBreaker): Breaker shared by all dates of the run.
+        revalidate (bool): Check already downloaded files against the server.
+
+    Returns:
+        Outcome: Outcome.OK, Outcome.NOT_MODIFIED or Outcome.SKIPPED if the files of
+            the date are downloaded, otherwise the outcome of the last attempt. None if the date
+            was not attempted because the circuit breaker gave up.
+    """
+    if not revalidate and is_downloaded(date_string):
+        logger.info(f"Files for date {date_string} already downloaded, skipping.")
+        return Outcome.SKIPPED
+
+    attempt = 0
+    while attempt < MAX_CURRENT_DATE_RETRIES:
+        # Circuit breaker to avoid overwhelming the server with requests
+        try:
+            probe = circuit_breaker.before()
+        except CircuitBreakerOpen as e:
+            if e.retry_in is None:
+                return None
+            sleep(e.retry_in)
+            continue
+        attempt += 1
 
         # Record if current download is successful or failed.
+        # Already checked above, the files are always requested from here on
         try:
-            success_flag = download_files(date_string)
+            outcome = download_files(date_string, revalidate=True, urls=urls)
         except Exception as e:
-            logging.error(
+            logger.error(
                 f"Unexpected Exception occurred while downloading files for date {date_string}: {e}"
             )
-            success_flag = 0
-
-        # Circuit breaker logic & retry mechanism
-        if success_flag == 0:
-            current_date_fails += 1
-            circuit_breaker_count += 1
-            logging.error(
-                f"Failed to download files for date {date_string}. Attempt {current_date_fails} of {MAX_CURRENT_DATE_RETRIES}."
+            outcome = Outcome.TRANSIENT
+
+        if outcome in (Outcome.OK, Outcome.NOT_MODIFIED):
+            circuit_breaker.on_success(probe)
+            return outcome
+
+        # The server answered, retrying would get the same answer
+        if outcome is Outcome.PERMANENT_MISSING:
+            circuit_breaker.on_success(probe)
+            logger.warning(
+                f"Files for date {date_string} are not published, possibly a holiday. Not retrying."
             )
-            if current_date_fails < MAX_CURRENT_DATE_RETRIES:
-                logging.info(f"Retrying download for date {date_string}...")
-                # Wait before retrying (optional)
-                sleep(2**current_date_fails)
-                continue  # Retry the same date
-            else:
-                dates_for_manual_retries.append(current_date.strftime("%Y-%m-%d"))
-                logging.error(
-                    f"Max retries reached for date {date_string}. Moving to next date."
+            return outcome
+        if outcome is Outcome.DATE_MISMATCH:
+            circuit_breaker.on_success(probe)
+            logger.warning(
+                f"Files for date {date_string} belong to another date, the date index needs an offset. Not retrying."
+            )
+            return outcome
+
+        circuit_breaker.on_failure(probe)
+        logger.error(
+            f"Failed to download files for date {date_string}. Attempt {attempt} of {MAX_CURRENT_DATE_RETRIES}."
+        )
+        if attempt < MAX_CURRENT_DATE_RETRIES:
+            logger.info(f"Retrying download for date {date_string}...")
+            # Wait before retrying, randomised ("full jitter") so that concurrent
+            # runs retrying the same date do not hit the server in lockstep
+            sleep(
+                random.uniform(
+                    0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2**attempt)
                 )
-        # Reset circuit breaker count on success
-        else:
-            circuit_breaker_count = 0
+            )
+
+    logger.error(f"Max retries reached for date {date_string}. Moving to next date.")
+    return outcome
+
+
+def load_state():
+    """Load the completed and failed dates recorded by previous runs.
+
+    Returns:
+        dict: {"completed": [...], "failed": [...], "last_attempted": ...}, with empty
+            lists if no run was recorded yet.
+    """
+    state = {"completed": [], "failed": [], "last_attempted": None}
+    try:
+        state.update(json.loads(STATE_FILE.read_text(encoding="utf-8")))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return state
+
 
-        # Proceed next step if not stopped before this.
-        current_date += timedelta(days=1)
-        current_date_fails = 0  # Reset fails for next date
+def save_state(completed, failed, last_attempted):
+    """Record the completed and failed dates, so they survive the process being killed.
+
+    Args:
+        completed (set): Dates downloaded successfully, in "YYYY-MM-DD" format.
+        failed (set): Dates that failed or were not attempted, in "YYYY-MM-DD" format.
+        last_attempted (str): The date that finished last, in "YYYY-MM-DD" format.
+    """
+    state = {
+        "completed": sorted(completed),
+        "failed": sorted(failed),
+        "last_attempted": last_attempted,
+    }
+    write_json_atomically(STATE_FILE, state)
+
+
+def download_files_within_range(
+    start_date,
+    end_date,
+    revalidate=False,
+    resume=False,
+    workers=MAX_CONCURRENT_DATES,
+    probe=False,
+):
+    """
+    Download files from SGX server for a range of dates.
+    Up to workers dates are downloaded at the same time.
+    The outcome of every date is recorded in STATE_FILE as soon as it is known.
+
+    Args:
+        start_date (str): The start date in "YYYY-MM-DD" format.
+        end_date (str): The end date in "YYYY-MM-DD" format.
+        revalidate (bool): Check already downloaded dates against the server
+            instead of skipping them.
+        resume (bool): Skip dates recorded as completed by previous runs.
+        workers (int): Number of dates downloaded at the same time, between 1 and
+            MAX_CONCURRENT_DATES (the connection pool is sized for that many).
+        probe (bool): Find the actual index of the dates not verified yet with
+            probe_indices, instead of relying on the estimate.
+
+    Returns:
+        None
+    """
+    if not 1 <= workers <= MAX_CONCURRENT_DATES:
+        raise ValueError(f"workers must be between 1 and {MAX_CONCURRENT_DATES}")
+
+    dates = weekday_dates(start_date, end_date)
+    logger.info(f"{len(dates)} weekday(s) to download, weekends are skipped.")
+
+    state = load_state()
+    completed = set(state["completed"])
+    failed = set(state["failed"])
+    if resume:
+        pending = [date_string for date_string in dates if date_string not in completed]
+        logger.info(
+            f"Resuming, {len(dates) - len(pending)} date(s) completed by previous runs are skipped."
+        )
+        dates = pending
+
+    known_indices = load_index_cache()
+    date_indices = estimate_date_indices(dates, known_indices)
+    if probe:
+        unverified = [
+            date_string for date_string in dates if date_string not in known_indices
+        ]
+        probed = probe_indices(unverified)
+        for date_string in unverified:
+            if (
+                date_string in probed
+                and probed[date_string] != date_indices[date_string]
+            ):
+                logger.info(
+                    f"Index of date {date_string} is {probed[date_string]}, estimated {date_indices[date_string]}."
+                )
+                date_indices[date_string] = probed[date_string]
+    urls_by_date = {date_string: [] for date_string in dates}
+    for date_string, _, url in plan_downloads(date_indices):
+        urls_by_date[date_string].append(url)
+
+    # Initialization and start the download process
+    circuit_breaker = CircuitBreaker(
+        CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN, CIRCUIT_BREAKER_MAX_PROBES
+    )
+    dates_for_manual_retries = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                download_date_with_retries,
+                date_string,
+                urls_by_date[date_string],
+                circuit_breaker,
+                revalidate,
+            ): date_string
+            for date_string in dates
+        }
+        for future in as_completed(futures):
+            date_string = futures[future]
+            outcome = future.result()
+            if outcome in (Outcome.OK, Outcome.NOT_MODIFIED, Outcome.SKIPPED):
+                completed.add(date_string)
+                failed.discard(date_string)
+            else:
+                failed.add(date_string)
+                dates_for_manual_retries.append(date_string)
+            # Only dated files received and validated in this run prove the index
+            # used, skipped or not modified dates were not checked
+            if (
+                outcome is Outcome.OK
+                and known_indices.get(date_string) != date_indices[date_string]
+            ):
+                known_indices[date_string] = date_indices[date_string]
+                save_index_cache(known_indices)
+            save_state(completed, failed, date_string)
 
     # Summary of failed downloads
     if dates_for_manual_retries != []:
-        logging.warning(
-            f"Some dates failed to download and may require manual retries: {dates_for_manual_retries}"
+        logger.warning(
+            f"Some dates failed to download and may require manual retries: {sorted(dates_for_manual_retries)}"
         )